@@ -0,0 +1,11 @@
+from google.adk.agents import BaseAgent
+
+
+def detached_copy(agent: BaseAgent) -> BaseAgent:
+    """Get a shallow copy of a cached agent that has no parent yet.
+
+    ADK agents can only have one parent, so a cached instance can't be placed
+    under a new root agent every turn. The copy shares the model, instruction
+    and tools of the cached agent but has its own parent slot.
+    """
+    return agent.model_copy(update={"parent_agent": None})
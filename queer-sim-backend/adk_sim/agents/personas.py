@@ -1,4 +1,10 @@
+import functools
+import string
+from collections.abc import Mapping
+from typing import Dict, Iterator, Optional, Tuple
+
 from google.adk.agents import LlmAgent
+from google.adk.tools import FunctionTool
 from config import config
 from ..tools import (
     send_message,
@@ -20,40 +26,38 @@ from ..callbacks import detect_timestamps_in_output
 # Shared model name
 MODEL_NAME = "gemini-2.0-flash"
 
-def create_persona_agent(agent_id: str, profile: dict) -> LlmAgent:
-    """Create an LlmAgent for a specific character persona with all tools."""
-    # Get current language from config
-    from config import config
-    lang = config.get("language", "en").replace("-", "_")
-
-    # Get name for current language
-    name_key = f"name_{lang}"
-    if name_key in profile and profile[name_key]:
-        name = profile[name_key]
-    elif lang != "en" and "name_en" in profile and profile["name_en"]:
-        name = profile["name_en"]
-    else:
-        name = profile.get("name", "")
-
-    # Get persona for current language
-    persona_key = f"persona_{lang}"
-    if persona_key in profile and profile[persona_key]:
-        persona = profile[persona_key]
-    elif lang != "en" and "persona_en" in profile and profile["persona_en"]:
-        persona = profile["persona_en"]
-    else:
-        persona = profile.get("persona", "")
-
-    # Check if storyline context is active
-    storyline_context = config.get("storyline_context_content", "")
-    storyline_dir = config.get("storyline_context_dir", "")
-    has_storyline_context = bool(storyline_context and storyline_context.strip())
-
-    # Create language-specific instruction template
-    if lang == "zh_Hans":
-        storyline_section = ""
-        if has_storyline_context:
-            storyline_section = f"""
+# Tool set shared by every persona agent, wrapped as FunctionTool once at
+# import so every persona reuses the same tool objects instead of ADK
+# re-wrapping the bare functions for each agent.
+# Put prepare_turn_context first so it's more likely to be considered
+_PERSONA_TOOLS = tuple(FunctionTool(func) for func in (
+    prepare_turn_context,
+    retrieve_scene,
+    # Webtoon storyline tools
+    plan_storyline,          # Create initial storyline
+    add_scene_to_episode,
+    refine_scene,
+    propose_episode_complete,
+    vote_episode_complete,
+    propose_story_complete,
+    vote_story_complete,
+    # Messaging / movement
+    send_message,
+    send_dm,
+    move_room,
+    wait,
+))
+
+# Language-specific instruction templates, built once at import.
+# Each instruction is laid out from most to least stable:
+#   shared rules -> storyline section -> persona suffix -> state context
+# The rules block is identical for every persona and turn, so keeping it first
+# (and free of ADK state references) gives Gemini's implicit prompt cache the
+# longest possible common prefix. Per-turn state such as {history_summary} is
+# injected by ADK into the trailing state-context block only.
+# Only the persona suffix ({name}, {agent_id}, {persona}) and the storyline
+# section ({storyline_context}) carry placeholders; see _compile().
+_STORYLINE_SECTION_ZH_HANS = """
 # 当前故事情节规划目标：
 你们正在规划一个特定的网络漫画故事情节。以下是这个故事的背景：
 
@@ -62,15 +66,11 @@ def create_persona_agent(agent_id: str, profile: dict) -> LlmAgent:
 **重要：你们的对话应该围绕如何规划这个故事情节的细节展开。讨论角色发展、场景设计、对话、视觉元素等具体细节。保持你的角色个性，但专注于为这个特定故事提供创意和规划建议。**
 """
 
-        instruction = f"""
-你是{name}。你的代理ID是\"{agent_id}\"。
-人物设定：
-{persona}
-
+_INSTRUCTION_RULES_ZH_HANS = """
 **重要：你必须用简体中文回复所有消息。所有对话、思考和回应都必须使用简体中文。**
 
 你在一个社交模拟房间中。你可以通过消息与他人互动，在房间之间移动，并引用节目。
-{storyline_section}
+
 # 网络漫画小组项目：
 小组正在合作创作一个新的韩国风格垂直滚动网络漫画，关于**两个男性化女同性恋者**。
 当感觉自然时，贡献以下想法：
@@ -79,16 +79,8 @@ def create_persona_agent(agent_id: str, profile: dict) -> LlmAgent:
 - 适合垂直堆叠面板的场景想法
 - 适合网络漫画面板的简短、有力的对话台词
 
-# 可用工具：
-- **prepare_turn_context(query)**: 搜索节目字幕和帧以获取相关内容。当对话提到节目、角色、场景、剧集或特定时刻时，首先使用此工具。这有助于你找到准确的引用和上下文。
-- **retrieve_scene(query, agent_name, room)**: 从视频中检索特定场景（返回转录文本和帧图像）。在讨论特定时刻或时间戳时使用。传递你的显示名称（"{name}"）和"group_chat"作为房间。
-- **send_message(text, room="group_chat", sender="")**: 向房间发送消息。发送者将根据你的代理ID自动确定。
-- **send_dm(text, to, from_user="")**: 向特定人员发送私信
-- **move_room(agent_id, agent_name, room)**: 移动到另一个房间。传递你的agent_id（"{agent_id}"）和你的显示名称（"{name}"）。
-- **wait(minutes)**: 等待一段时间（谨慎使用）
-
 # 回复工作流程：
-1. **始终首先检查是否需要上下文检索：**
+1. **始终首先检查是否需要上下文检索**（当对话涉及节目、角色或场景时，你必须在回复前使用prepare_turn_context，以确保引用准确）：
    - 如果对话提到节目、角色、场景、剧集或特定时刻 → 使用**prepare_turn_context**，查询总结正在讨论的内容
    - 如果有人询问特定场景或时间戳 → 使用**retrieve_scene**获取帧和转录
    - prepare_turn_context的示例查询："角色之间的情感时刻"、"接吻场景"、"对抗"、"角色名称"、"第2集结尾"
@@ -96,11 +88,9 @@ def create_persona_agent(agent_id: str, profile: dict) -> LlmAgent:
 2. **调用prepare_turn_context后，使用返回的上下文：**
    - 工具返回`show_snips`（带时间戳的相关字幕引用）和`frame_context`（可用的视频帧）
    - 使用`show_snips`查找准确的引用以包含在你的消息中
-   - 引用时参考特定时间戳（例如，"我是认真的"（00:12:34–00:12:36））
 
 3. **制定你的回复：**
    - 使用检索到的节目片段来告知你的回复
-   - 在相关时引用实际字幕文本（带时间戳）
    - 忠于你的人物设定
    - **用简体中文回复**
 
@@ -110,29 +100,17 @@ def create_persona_agent(agent_id: str, profile: dict) -> LlmAgent:
 - 引用节目时，直接引用实际字幕文本（例如，"我是认真的"（E1P2 00:12:34–00:12:36））。
 - 在引用后的括号中包含时间码以显示出现时间。
 - 最多引用一条短字幕行；否则进行转述。
-- 不要编造不在提供行中的引用。
-- 尽可能使用字幕的确切措辞。
-
-# 状态中可用的上下文：
-- 房间中的最近聊天：{{history_summary}}
-- 用户的最新消息：{{new_message}}
-- 调用prepare_turn_context后，你将可以访问：{{turn_context.show_snips}}和{{turn_context.frame_context}}
-- 当前网络漫画JSON（如果有）：{{current_storyline_json}}
-- 此回合的故事情节焦点标志：{{storyline_focus}}
-- 当前剧集编号：{{current_episode_number}}
-- 剧集进度摘要：{{episode_progress}}
+- 不要编造不在提供行中的引用；尽可能使用字幕的确切措辞。
 
 # 规则：
-- **重要**：当对话涉及节目、角色或场景时，你必须在回复前使用prepare_turn_context。这确保你的引用和参考是准确的。
 - 如果对话转向创建/继续网络漫画，建议1个具体节拍，并在适当时使用工具更新共享的故事情节JSON。
-- **关键**：在使用add_scene_to_episode或refine_scene之前，检查是否存在故事情节（{{current_storyline_json}}）。如果为空或缺失，你必须首先调用plan_storyline(storyline_json=...)创建初始故事情节，至少包含2个角色和3个场景。使用严格的JSON格式（无markdown，无注释）。
-- **剧集完成目标**：第一集必须正好包含 **12个场景**。当前进度：{{episode_progress}}
-- **关键行动**：如果{{storyline_focus}}是"expand"且存在故事情节：
+- **关键**：在使用add_scene_to_episode或refine_scene之前，检查是否存在故事情节（见下方“当前网络漫画JSON”）。如果为空或缺失，你必须首先调用plan_storyline(storyline_json=...)创建初始故事情节，至少包含2个角色和3个场景。使用严格的JSON格式（无markdown，无注释）。
+- **剧集完成目标**：第一集必须正好包含 **12个场景**。当前进度见下方“剧集进度摘要”。
+- **关键行动**：如果故事情节焦点标志是"expand"且存在故事情节：
   - **优先使用 add_scene_to_episode(scene_summary=..., panels=[...])** 添加新场景，直到达到12个场景
-  - 每个场景必须包含3-6个面板
   - 只有在场景数量已经足够时，才使用 refine_scene() 完善现有场景
   - 然后正常继续聊天
-- **关键**：永远不要尝试细化或添加已完成剧集的场景。始终处理当前剧集（{{current_episode_number}}）。
+- **关键**：永远不要尝试细化或添加已完成剧集的场景。始终处理当前剧集（见下方“当前剧集编号”）。
 - **网络漫画工具的关键**：
   - 每个场景必须包含 **3到6个面板**。
   - 确保每个面板都有对话。使用格式如：
@@ -148,10 +126,26 @@ def create_persona_agent(agent_id: str, profile: dict) -> LlmAgent:
 - 保持消息1-3个短句。在适当时以温和的问题结尾以邀请他人参与。
 - 忠于你的人物设定，自然地参与对话。**记住：始终用简体中文回复。**
 """
-    elif lang == "zh_Hant":
-        storyline_section = ""
-        if has_storyline_context:
-            storyline_section = f"""
+
+_PERSONA_SUFFIX_ZH_HANS = """
+# 你的角色：
+你是{name}。你的代理ID是"{agent_id}"。
+人物设定：
+{persona}
+"""
+
+_STATE_CONTEXT_ZH_HANS = """
+# 状态中可用的上下文：
+- 房间中的最近聊天：{history_summary}
+- 用户的最新消息：{new_message}
+- 调用prepare_turn_context后，你将可以访问：{turn_context.show_snips}和{turn_context.frame_context}
+- 当前网络漫画JSON（如果有）：{current_storyline_json}
+- 此回合的故事情节焦点标志：{storyline_focus}
+- 当前剧集编号：{current_episode_number}
+- 剧集进度摘要：{episode_progress}
+"""
+
+_STORYLINE_SECTION_ZH_HANT = """
 # 當前故事情節規劃目標：
 你們正在規劃一個特定的網絡漫畫故事情節。以下是這個故事的背景：
 
@@ -160,15 +154,11 @@ def create_persona_agent(agent_id: str, profile: dict) -> LlmAgent:
 **重要：你們的對話應該圍繞如何規劃這個故事情節的細節展開。討論角色發展、場景設計、對話、視覺元素等具體細節。保持你的角色個性，但專注於為這個特定故事提供創意和規劃建議。**
 """
 
-        instruction = f"""
-你是{name}。你的代理ID是\"{agent_id}\"。
-人物設定：
-{persona}
-
+_INSTRUCTION_RULES_ZH_HANT = """
 **重要：你必須用繁體中文回覆所有消息。所有對話、思考和回應都必須使用繁體中文。**
 
 你在一個社交模擬房間中。你可以通過消息與他人互動，在房間之間移動，並引用節目。
-{storyline_section}
+
 # 網絡漫畫小組項目：
 小組正在合作創作一個新的韓國風格垂直滾動網絡漫畫，關於**兩個男性化女同性戀者**。
 當感覺自然時，貢獻以下想法：
@@ -177,16 +167,8 @@ def create_persona_agent(agent_id: str, profile: dict) -> LlmAgent:
 - 適合垂直堆疊面板的場景想法
 - 適合網絡漫畫面板的簡短、有力的對話台詞
 
-# 可用工具：
-- **prepare_turn_context(query)**: 搜索節目字幕和幀以獲取相關內容。當對話提到節目、角色、場景、劇集或特定時刻時，首先使用此工具。這有助於你找到準確的引用和上下文。
-- **retrieve_scene(query, agent_name, room)**: 從視頻中檢索特定場景（返回轉錄文本和幀圖像）。在討論特定時刻或時間戳時使用。傳遞你的顯示名稱（"{name}"）和"group_chat"作為房間。
-- **send_message(text, room="group_chat", sender="")**: 向房間發送消息。發送者將根據你的代理ID自動確定。
-- **send_dm(text, to, from_user="")**: 向特定人員發送私信
-- **move_room(agent_id, agent_name, room)**: 移動到另一個房間。傳遞你的agent_id（"{agent_id}"）和你的顯示名稱（"{name}"）。
-- **wait(minutes)**: 等待一段時間（謹慎使用）
-
 # 回覆工作流程：
-1. **始終首先檢查是否需要上下文檢索：**
+1. **始終首先檢查是否需要上下文檢索**（當對話涉及節目、角色或場景時，你必須在回覆前使用prepare_turn_context，以確保引用準確）：
    - 如果對話提到節目、角色、場景、劇集或特定時刻 → 使用**prepare_turn_context**，查詢總結正在討論的內容
    - 如果有人詢問特定場景或時間戳 → 使用**retrieve_scene**獲取幀和轉錄
    - prepare_turn_context的示例查詢："角色之間的情感時刻"、"接吻場景"、"對抗"、"角色名稱"、"第2集結尾"
@@ -194,11 +176,9 @@ def create_persona_agent(agent_id: str, profile: dict) -> LlmAgent:
 2. **調用prepare_turn_context後，使用返回的上下文：**
    - 工具返回`show_snips`（帶時間戳的相關字幕引用）和`frame_context`（可用的視頻幀）
    - 使用`show_snips`查找準確的引用以包含在你的消息中
-   - 引用時參考特定時間戳（例如，"我是認真的"（00:12:34–00:12:36））
 
 3. **制定你的回覆：**
    - 使用檢索到的節目片段來告知你的回覆
-   - 在相關時引用實際字幕文本（帶時間戳）
    - 忠於你的人物設定
    - **用繁體中文回覆**
 
@@ -208,29 +188,17 @@ def create_persona_agent(agent_id: str, profile: dict) -> LlmAgent:
 - 引用節目時，直接引用實際字幕文本（例如，"我是認真的"（E1P2 00:12:34–00:12:36））。
 - 在引用後的括號中包含時間碼以顯示出現時間。
 - 最多引用一條短字幕行；否則進行轉述。
-- 不要編造不在提供行中的引用。
-- 盡可能使用字幕的確切措辭。
-
-# 狀態中可用的上下文：
-- 房間中的最近聊天：{{history_summary}}
-- 用戶的最新消息：{{new_message}}
-- 調用prepare_turn_context後，你將可以訪問：{{turn_context.show_snips}}和{{turn_context.frame_context}}
-- 當前網絡漫畫JSON（如果有）：{{current_storyline_json}}
-- 此回合的故事情節焦點標誌：{{storyline_focus}}
-- 當前劇集編號：{{current_episode_number}}
-- 劇集進度摘要：{{episode_progress}}
+- 不要編造不在提供行中的引用；盡可能使用字幕的確切措辭。
 
 # 規則：
-- **重要**：當對話涉及節目、角色或場景時，你必須在回覆前使用prepare_turn_context。這確保你的引用和參考是準確的。
 - 如果對話轉向創建/繼續網絡漫畫，建議1個具體節拍，並在適當時使用工具更新共享的故事情節JSON。
-- **關鍵**：在使用add_scene_to_episode或refine_scene之前，檢查是否存在故事情節（{{current_storyline_json}}）。如果為空或缺失，你必須首先調用plan_storyline(storyline_json=...)創建初始故事情節，至少包含2個角色 and 3個場景。使用嚴格的JSON格式（無markdown，無註釋）。
-- **劇集完成目標**：第一集必須正好包含 **12個場景**。當前進度：{{episode_progress}}
-- **關鍵行動**：如果{{storyline_focus}}是"expand"且存在故事情節：
+- **關鍵**：在使用add_scene_to_episode或refine_scene之前，檢查是否存在故事情節（見下方「當前網絡漫畫JSON」）。如果為空或缺失，你必須首先調用plan_storyline(storyline_json=...)創建初始故事情節，至少包含2個角色和3個場景。使用嚴格的JSON格式（無markdown，無註釋）。
+- **劇集完成目標**：第一集必須正好包含 **12個場景**。當前進度見下方「劇集進度摘要」。
+- **關鍵行動**：如果故事情節焦點標誌是"expand"且存在故事情節：
   - **優先使用 add_scene_to_episode(scene_summary=..., panels=[...])** 添加新場景，直到達到12個場景
-  - 每個場景必須包含3-6個面板
   - 只有在場景數量已經足夠時，才使用 refine_scene() 完善現有場景
   - 然後正常繼續聊天
-- **關鍵**：永遠不要嘗試細化或添加已完成劇集的場景。始終處理當前劇集（{{current_episode_number}}）。
+- **關鍵**：永遠不要嘗試細化或添加已完成劇集的場景。始終處理當前劇集（見下方「當前劇集編號」）。
 - **網絡漫畫工具的關鍵**：
   - 每個場景必須包含 **3到6個面板**。
   - 確保每個面板都有對話。使用格式如：
@@ -246,10 +214,26 @@ def create_persona_agent(agent_id: str, profile: dict) -> LlmAgent:
 - 保持消息1-3個短句。在適當時以溫和的問題結尾以邀請他人參與。
 - 忠於你的人物設定，自然地參與對話。**記住：始終用繁體中文回覆。**
 """
-    else:  # English
-        storyline_section = ""
-        if has_storyline_context:
-            storyline_section = f"""
+
+_PERSONA_SUFFIX_ZH_HANT = """
+# 你的角色：
+你是{name}。你的代理ID是"{agent_id}"。
+人物設定：
+{persona}
+"""
+
+_STATE_CONTEXT_ZH_HANT = """
+# 狀態中可用的上下文：
+- 房間中的最近聊天：{history_summary}
+- 用戶的最新消息：{new_message}
+- 調用prepare_turn_context後，你將可以訪問：{turn_context.show_snips}和{turn_context.frame_context}
+- 當前網絡漫畫JSON（如果有）：{current_storyline_json}
+- 此回合的故事情節焦點標誌：{storyline_focus}
+- 當前劇集編號：{current_episode_number}
+- 劇集進度摘要：{episode_progress}
+"""
+
+_STORYLINE_SECTION_EN = """
 # Current Storyline Planning Goal:
 You are currently planning a specific webtoon storyline. Here is the background for this story:
 
@@ -258,13 +242,9 @@ You are currently planning a specific webtoon storyline. Here is the background
 **IMPORTANT: Your conversations should focus on planning the details of this specific storyline. Discuss character development, scene design, dialogue, visual elements, and other specific details. Stay in character, but focus on providing creative ideas and planning suggestions for this particular story.**
 """
 
-        instruction = f"""
-You are {name}. Your agent id is \"{agent_id}\".
-Persona:
-{persona}
-
+_INSTRUCTION_RULES_EN = """
 You are in a social simulation room. You can interact with others through messages, move between rooms, and reference the show.
-{storyline_section}
+
 # Webtoon group project:
 The group is also collaborating on a new Korean-style vertical-scroll webtoon about **two masc lesbians**.
 When it feels natural, contribute ideas for:
@@ -273,16 +253,8 @@ When it feels natural, contribute ideas for:
 - Scene ideas that work as stacked vertical panels
 - Short, punchy dialogue lines suitable for a webtoon panel
 
-# Available Tools:
-- **prepare_turn_context(query)**: Search the show subtitles and frames for relevant content. USE THIS FIRST when the conversation mentions the show, characters, scenes, episodes, or specific moments. This helps you find accurate quotes and context.
-- **retrieve_scene(query, agent_name, room)**: Retrieve a specific scene from the video (returns both transcript text and frame images). Use when discussing a specific moment or timestamp. Pass your display name ("{name}") and "group_chat" as the room.
-- **send_message(text, room="group_chat", sender="")**: Send a message to a room. The sender will be automatically determined from your agent ID.
-- **send_dm(text, to, from_user="")**: Send a direct message to a specific person
-- **move_room(agent_id, agent_name, room)**: Move to another room. Pass your agent_id ("{agent_id}") and your display name ("{name}").
-- **wait(minutes)**: Do nothing for a while (use sparingly)
-
 # Workflow for responding:
-1. **ALWAYS start by checking if context retrieval is needed:**
+1. **ALWAYS start by checking if context retrieval is needed** (you MUST use prepare_turn_context BEFORE responding whenever the conversation is about the show, characters, or scenes, so your quotes are accurate):
    - If the conversation mentions the show, characters, scenes, episodes, or specific moments → use **prepare_turn_context** with a query summarizing what's being discussed
    - If someone asks about a specific scene or timestamp → use **retrieve_scene** to get the frame and transcript
    - Example queries for prepare_turn_context: "emotional moment between characters", "kiss scene", "confrontation", "character name", "episode 2 ending"
@@ -290,11 +262,9 @@ When it feels natural, contribute ideas for:
 2. **After calling prepare_turn_context, use the returned context:**
    - The tool returns `show_snips` (relevant subtitle quotes with timestamps) and `frame_context` (available video frames)
    - Use the `show_snips` to find accurate quotes to include in your message
-   - Reference specific timestamps when quoting (e.g., "I'm serious" (00:12:34–00:12:36))
 
 3. **Formulate your response:**
    - Use the retrieved show snippets to inform your reply
-   - Quote actual subtitle text when relevant (with timestamps)
    - Be authentic to your persona
 
 4. **Output your final message as plain text** (not a tool call)
@@ -303,29 +273,17 @@ When it feels natural, contribute ideas for:
 - When referencing the show, quote the actual subtitle text directly (e.g., "I'm serious" (E1P2 00:12:34–00:12:36)).
 - Include the timecode in parentheses after the quote to show when it appears.
 - Quote at most ONE short subtitle line; otherwise paraphrase.
-- Don't invent quotes that aren't in the provided lines.
-- Use the exact wording from the subtitle when possible.
-
-# Context available in state:
-- Recent chat in room: {{history_summary}}
-- User's latest message: {{new_message}}
-- After calling prepare_turn_context, you'll have access to: {{turn_context.show_snips}} and {{turn_context.frame_context}}
-- Current webtoon JSON (if any): {{current_storyline_json}}
-- Storyline focus flag for this turn: {{storyline_focus}}
-- Current episode number: {{current_episode_number}}
-- Episode progress summary: {{episode_progress}}
+- Don't invent quotes that aren't in the provided lines; use the exact subtitle wording when possible.
 
 # Rules:
-- **IMPORTANT**: When the conversation is about the show, characters, or scenes, you MUST use prepare_turn_context BEFORE responding. This ensures your quotes and references are accurate.
 - If the conversation turns toward creating/continuing the webtoon, suggest 1 concrete beat and (when appropriate) use the tools to update the shared storyline JSON.
-- **CRITICAL**: Before using add_scene_to_episode or refine_scene, check if a storyline exists ({{current_storyline_json}}). If it's empty or missing, you MUST first call plan_storyline(storyline_json=...) to create the initial storyline with at least 2 characters and 3 scenes. Use a strict JSON format (no markdown, no comments).
-- **Episode Completion Goal**: Episode 1 must have exactly **12 scenes**. Current Progress: {{episode_progress}}
-- **CRITICAL ACTION**: If {{storyline_focus}} is \"expand\" and a storyline exists:
+- **CRITICAL**: Before using add_scene_to_episode or refine_scene, check if a storyline exists (see "Current webtoon JSON" below). If it's empty or missing, you MUST first call plan_storyline(storyline_json=...) to create the initial storyline with at least 2 characters and 3 scenes. Use a strict JSON format (no markdown, no comments).
+- **Episode Completion Goal**: Episode 1 must have exactly **12 scenes**. See "Episode progress summary" below for current progress.
+- **CRITICAL ACTION**: If the storyline focus flag is "expand" and a storyline exists:
   - **PRIORITIZE add_scene_to_episode(scene_summary=..., panels=[...])** to add new scenes until 12 scenes are reached
-  - Each scene must have 3-6 panels
   - Only use refine_scene() to polish existing scenes when scene count is sufficient
   - Then continue chatting normally
-- **CRITICAL**: NEVER try to refine or add scenes to completed episodes. Always work on the current episode ({{current_episode_number}}).
+- **CRITICAL**: NEVER try to refine or add scenes to completed episodes. Always work on the current episode (see "Current episode number" below).
 - **CRITICAL for webtoon tools**:
   - Every scene MUST have **3 to 6 panels**.
   - Ensure every panel has dialogue. Use formats like:
@@ -343,37 +301,233 @@ When it feels natural, contribute ideas for:
 Be authentic to your persona and engage naturally with the conversation.
 """
 
+_PERSONA_SUFFIX_EN = """
+# Your character:
+You are {name}. Your agent id is "{agent_id}".
+Persona:
+{persona}
+"""
+
+_STATE_CONTEXT_EN = """
+# Context available in state:
+- Recent chat in room: {history_summary}
+- User's latest message: {new_message}
+- After calling prepare_turn_context, you'll have access to: {turn_context.show_snips} and {turn_context.frame_context}
+- Current webtoon JSON (if any): {current_storyline_json}
+- Storyline focus flag for this turn: {storyline_focus}
+- Current episode number: {current_episode_number}
+- Episode progress summary: {episode_progress}
+"""
+
+# Per-language prompt sections (English is the fallback for other languages)
+_PROMPT_SECTIONS = {
+    "zh_Hans": {
+        "rules": _INSTRUCTION_RULES_ZH_HANS,
+        "storyline_section": _STORYLINE_SECTION_ZH_HANS,
+        "persona_suffix": _PERSONA_SUFFIX_ZH_HANS,
+        "state_context": _STATE_CONTEXT_ZH_HANS,
+    },
+    "zh_Hant": {
+        "rules": _INSTRUCTION_RULES_ZH_HANT,
+        "storyline_section": _STORYLINE_SECTION_ZH_HANT,
+        "persona_suffix": _PERSONA_SUFFIX_ZH_HANT,
+        "state_context": _STATE_CONTEXT_ZH_HANT,
+    },
+    "en": {
+        "rules": _INSTRUCTION_RULES_EN,
+        "storyline_section": _STORYLINE_SECTION_EN,
+        "persona_suffix": _PERSONA_SUFFIX_EN,
+        "state_context": _STATE_CONTEXT_EN,
+    },
+}
+
+
+# A template pre-split into (literal, field_name) segments; field_name is None
+# for the trailing literal.
+_Segments = Tuple[Tuple[str, Optional[str]], ...]
+
+_FORMATTER = string.Formatter()
+
+
+def _compile(template: str) -> _Segments:
+    """Pre-split a str.format-style template so rendering needs no parsing."""
+    return tuple((literal, field) for literal, field, _, _ in _FORMATTER.parse(template))
+
+
+def _render(segments: _Segments, **values: str) -> str:
+    """Fill a compiled template by plain concatenation."""
+    return "".join(
+        literal + values[field] if field is not None else literal
+        for literal, field in segments
+    )
+
+
+def _build_template(sections: Dict[str, str]) -> Tuple[str, _Segments, _Segments, str]:
+    """Assemble one language's sections into
+    (rules, storyline_segments, persona_segments, state_context).
+
+    Only the storyline section and persona suffix carry placeholders; they are
+    compiled once here. The rules and state context are used verbatim (ADK
+    fills their {state} references at request time).
+    """
+    return (
+        sections["rules"],
+        _compile(sections["storyline_section"]),
+        _compile(sections["persona_suffix"]),
+        sections["state_context"],
+    )
+
+
+@functools.lru_cache(maxsize=3)
+def _get_template(lang: str) -> Tuple[str, _Segments, _Segments, str]:
+    """Get the assembled template for a language, building it on first use."""
+    return _build_template(_PROMPT_SECTIONS.get(lang, _PROMPT_SECTIONS["en"]))
+
+
+@functools.lru_cache(maxsize=8)
+def _get_instruction_shell(lang: str, storyline_context: str) -> Tuple[str, _Segments, str]:
+    """Get everything but the persona identity for a language and storyline context.
+
+    Returns (prefix, persona_segments, state_context) where prefix is the shared
+    rules plus the rendered storyline section (empty when there is no context).
+    """
+    rules, storyline_segments, persona_segments, state_context = _get_template(lang)
+    prefix = rules
+    if storyline_context and storyline_context.strip():
+        prefix += _render(storyline_segments, storyline_context=storyline_context)
+    return prefix, persona_segments, state_context
+
+
+def _localized_field(profile: dict, field: str, lang: str) -> str:
+    """Pick a profile field for a language, falling back to English, then the legacy field."""
+    value = profile.get(f"{field}_{lang}")
+    if value:
+        return value
+    if lang != "en" and profile.get(f"{field}_en"):
+        return profile[f"{field}_en"]
+    return profile.get(field, "")
+
+
+@functools.lru_cache(maxsize=None)
+def _resolve_localized(agent_id: str, lang: str) -> Tuple[str, str]:
+    """Get (name, persona) of a configured agent profile for a language."""
+    profile = config.get("agent_profiles", {}).get(agent_id, {})
+    return _localized_field(profile, "name", lang), _localized_field(profile, "persona", lang)
+
+
+def invalidate_persona_cache() -> None:
+    """Drop cached profile data; call after agent profiles change in config."""
+    _resolve_localized.cache_clear()
+    persona_agents.clear()
+
+
+def _localized_profile(agent_id: str, profile: Optional[dict], lang: str) -> Tuple[str, str]:
+    """Get (name, persona) for a language; configured profiles use the cache."""
+    if profile is None:
+        return _resolve_localized(agent_id, lang)
+    return _localized_field(profile, "name", lang), _localized_field(profile, "persona", lang)
+
+
+def _new_persona_agent(
+    agent_id: str, name: str, persona: str, shell: Tuple[str, _Segments, str]
+) -> LlmAgent:
+    """Build a persona LlmAgent from an instruction shell and its identity."""
+    prefix, persona_segments, state_context = shell
+    # Static rules first, per-persona identity and per-turn state last
+    instruction = "".join((
+        prefix,
+        _render(persona_segments, name=name, agent_id=agent_id, persona=persona),
+        state_context,
+    ))
+
     return LlmAgent(
         name=agent_id,
         model=MODEL_NAME,
         instruction=instruction,
-        # Put prepare_turn_context first so it's more likely to be considered
-            tools=[
-                prepare_turn_context,
-                retrieve_scene,
-                # Webtoon storyline tools
-                plan_storyline,          # Create initial storyline
-                add_scene_to_episode,
-                refine_scene,
-                propose_episode_complete,
-                vote_episode_complete,
-                propose_story_complete,
-                vote_story_complete,
-                # Messaging / movement
-                send_message,
-                send_dm,
-                move_room,
-                wait,
-            ],
+        tools=list(_PERSONA_TOOLS),
         # Write the final message text into state so a downstream dispatcher can publish it
         output_key=f"{agent_id}_reply",
         # After model callback to detect timestamps in final output and retrieve frames
         after_model_callback=detect_timestamps_in_output,
     )
 
-# Note: Persona agents are now created dynamically per-turn in root.py
-# to ensure they use the current language setting. This static instantiation
-# is kept for backward compatibility but may not reflect current language.
-profiles = config.get("agent_profiles", {})
-persona_agents = {aid: create_persona_agent(aid, p) for aid, p in profiles.items()}
 
+def create_persona_agent(agent_id: str, profile: Optional[dict] = None) -> LlmAgent:
+    """Create an LlmAgent for a specific character persona with all tools.
+
+    If no profile is passed, the configured profile for agent_id is used and its
+    localized name/persona are served from a per-language cache.
+    """
+    # Get current language from config (module-level config is live)
+    lang = config.get("language", "en").replace("-", "_")
+    name, persona = _localized_profile(agent_id, profile, lang)
+
+    # Shared rules + storyline section, cached per (lang, storyline context)
+    shell = _get_instruction_shell(lang, config.get("storyline_context_content", ""))
+    return _new_persona_agent(agent_id, name, persona, shell)
+
+
+def create_persona_agents_batch(
+    profiles: Optional[Dict[str, dict]] = None, lang: Optional[str] = None
+) -> Dict[str, LlmAgent]:
+    """Create persona agents for several profiles sharing one instruction shell.
+
+    Args:
+        profiles: Mapping of agent_id -> profile. Defaults to the configured
+            agent profiles (resolved through the per-language cache).
+        lang: Language code; defaults to the configured language.
+
+    Returns:
+        Dict of agent_id -> freshly created LlmAgent
+    """
+    lang = (lang or config.get("language", "en")).replace("-", "_")
+    shell = _get_instruction_shell(lang, config.get("storyline_context_content", ""))
+    if profiles is None:
+        ids = config.get("agent_profiles", {}).keys()
+        return {aid: _new_persona_agent(aid, *_resolve_localized(aid, lang), shell) for aid in ids}
+    return {
+        aid: _new_persona_agent(aid, *_localized_profile(aid, profile, lang), shell)
+        for aid, profile in profiles.items()
+    }
+
+
+class _LazyPersonaAgents(Mapping):
+    """Read-only mapping of agent_id -> persona agent, built on first access.
+
+    All configured agents are built together with create_persona_agents_batch
+    and cached per (language, storyline context); the whole set is rebuilt the
+    next time it is read after either setting or the profiles change.
+    """
+
+    def __init__(self) -> None:
+        self._key: Optional[Tuple[str, str]] = None
+        self._agents: Dict[str, LlmAgent] = {}
+
+    def __getitem__(self, agent_id: str) -> LlmAgent:
+        if agent_id not in config.get("agent_profiles", {}):
+            raise KeyError(agent_id)
+        key = (
+            config.get("language", "en").replace("-", "_"),
+            config.get("storyline_context_content", ""),
+        )
+        if key != self._key or agent_id not in self._agents:
+            self._agents = create_persona_agents_batch(lang=key[0])
+            self._key = key
+        return self._agents[agent_id]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(config.get("agent_profiles", {}))
+
+    def __len__(self) -> int:
+        return len(config.get("agent_profiles", {}))
+
+    def clear(self) -> None:
+        """Drop all cached agents."""
+        self._key = None
+        self._agents = {}
+
+
+# Persona agents are built lazily on first access and rebuilt when the language
+# or storyline context changes. root.py places detached copies of these under
+# each turn's root agent, since an ADK agent can only have one parent.
+persona_agents = _LazyPersonaAgents()
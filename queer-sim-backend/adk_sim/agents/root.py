@@ -1,10 +1,17 @@
+import functools
+import itertools
 import random
-from google.adk.agents import LlmAgent, SequentialAgent
-from .personas import create_persona_agent
+from google.adk.agents import LlmAgent, ParallelAgent, SequentialAgent
+from .cache import detached_copy
+from .personas import persona_agents
 from config import config
-from ..tools import dispatch_persona_replies
+from ..tools import dispatch_persona_replies, PERSONA_IDS
 from .storyline import create_storyline_pipeline, create_storyline_plan_only_pipeline
 
+# Every possible persona order, precomputed; each turn picks one at random
+_PERSONA_ORDERS = tuple(itertools.permutations(PERSONA_IDS))
+
+
 def create_dispatch_agent() -> LlmAgent:
     """Create a fresh dispatch agent instance to avoid parent agent conflicts."""
     return LlmAgent(
@@ -19,6 +26,12 @@ Do not write anything else.
     )
 
 
+@functools.lru_cache(maxsize=1)
+def _get_dispatch_agent() -> LlmAgent:
+    """Get the shared dispatch agent; its definition never changes."""
+    return create_dispatch_agent()
+
+
 def create_root_agent_with_shuffled_order(
     *,
     enable_storyline: bool = False,
@@ -27,43 +40,44 @@ def create_root_agent_with_shuffled_order(
     """
     Create a root SequentialAgent with persona agents in a random order.
     This ensures each agent sees state updates in a different order each turn.
+    With config "parallel_personas" enabled, the personas run concurrently
+    in a ParallelAgent instead.
 
-    Note: We create fresh agent instances each time because ADK agents can only
-    have one parent. Reusing the same instances would cause a validation error.
+    Note: ADK agents can only have one parent, so the cached persona and
+    dispatch agents are never placed in the tree directly. Each turn gets
+    detached shallow copies of them instead of rebuilding every LlmAgent.
 
     Returns:
         A SequentialAgent with shuffled persona agents + dispatch agent,
         optionally extended with a LoopAgent storyline refinement pipeline.
     """
-    # Create fresh agent instances to avoid "agent already has a parent" error
-    profiles = config.get("agent_profiles", {})
-    fresh_agents = {
-        aid: create_persona_agent(aid, profile)
-        for aid, profile in profiles.items()
-    }
-
-    # Get all persona agents in a list
-    agents_list = [fresh_agents["a1"], fresh_agents["a2"], fresh_agents["a3"]]
-
-    # Shuffle the order
-    shuffled = agents_list.copy()
-    random.shuffle(shuffled)
-
-    # Log the order for debugging
-    order = [agent.name for agent in shuffled]
-    print(f"[ROOT] Creating SequentialDeciders with shuffled order: {order}")
-
-    # Create SequentialAgent with shuffled persona agents
-    sequential_deciders = SequentialAgent(
-        name="SequentialDeciders",
-        sub_agents=shuffled,
-        description="Persona agents running sequentially in shuffled order"
-    )
-
-    # Create a fresh dispatch agent to avoid parent conflicts
-    fresh_dispatch_agent = create_dispatch_agent()
-
-    sub_agents = [sequential_deciders, fresh_dispatch_agent]
+    # Detached copies of the cached persona agents avoid the "agent already
+    # has a parent" error without rebuilding them
+    if config.get("parallel_personas", False):
+        # Persona LLM calls overlap, so order doesn't matter; each writes only its
+        # own {aid}_reply key and dispatch publishes replies in a fixed order afterwards.
+        print(f"[ROOT] Creating ParallelDeciders: {PERSONA_IDS}")
+        deciders = ParallelAgent(
+            name="ParallelDeciders",
+            sub_agents=[detached_copy(persona_agents[aid]) for aid in PERSONA_IDS],
+            description="Persona agents running concurrently"
+        )
+    else:
+        # Pick a random order
+        order = random.choice(_PERSONA_ORDERS)
+        shuffled = [detached_copy(persona_agents[aid]) for aid in order]
+        print(f"[ROOT] Creating SequentialDeciders with shuffled order: {order}")
+        # Create SequentialAgent with shuffled persona agents
+        deciders = SequentialAgent(
+            name="SequentialDeciders",
+            sub_agents=shuffled,
+            description="Persona agents running sequentially in shuffled order"
+        )
+
+    # Detached copy of the shared dispatch agent to avoid parent conflicts
+    fresh_dispatch_agent = detached_copy(_get_dispatch_agent())
+
+    sub_agents = [deciders, fresh_dispatch_agent]
 
     # Optional extension: webtoon storyline planning.
     if enable_storyline:
@@ -72,12 +86,12 @@ def create_root_agent_with_shuffled_order(
         else:
             sub_agents.append(create_storyline_pipeline())
 
-    # Create root agent with sequential deciders + dispatch (+ optional storyline pipeline)
+    # Create root agent with persona deciders + dispatch (+ optional storyline pipeline)
     root = SequentialAgent(
         name="QueerSimRoot",
         sub_agents=sub_agents,
         description=(
-            "Sequential persona agents (with shuffled order each turn) + deterministic dispatch"
+            "Persona agents (shuffled sequential or parallel) + deterministic dispatch"
             + (" + webtoon storyline planning" if enable_storyline else "")
         ),
     )
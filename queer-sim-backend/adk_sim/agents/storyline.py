@@ -1,19 +1,38 @@
-from google.adk.agents import LlmAgent, LoopAgent, SequentialAgent
+import functools
+import os
+from typing import AsyncGenerator
+
+from google.adk.agents import BaseAgent, LlmAgent, LoopAgent, SequentialAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event
+from google.adk.events.event_actions import EventActions
+from google.adk.sessions.state import State
 from config import config
 
-from ..tools import prepare_turn_context, retrieve_scene, plan_storyline, review_storyline, refine_storyline, exit_loop
+from .cache import detached_copy
+from ..tools import (
+    prepare_turn_context,
+    retrieve_scene,
+    plan_storyline,
+    review_storyline,
+    refine_storyline,
+    exit_loop,
+    evaluate_storyline,
+    current_storyline_version,
+    announce_refinement_complete,
+)
 
 
 MODEL_NAME = "gemini-2.0-flash"
-
-
-def get_webtoon_goal(lang: str = None) -> str:
-    """Get webtoon goal text in the specified language."""
-    if lang is None:
-        lang = config.get("language", "en").replace("-", "_")
-
-    goals = {
-        "en": """
+# Default for the lighter reviewer model, used when neither config
+# "storyline_reviewer_model" nor STORYLINE_REVIEWER_MODEL is set. The reviewer
+# runs only when the structural review fails and turns the tool's issue list
+# into feedback, so a smaller model is enough.
+REVIEWER_MODEL = "gemini-2.0-flash-lite"
+
+# Webtoon goal text per language (English is the fallback)
+_WEBTOON_GOALS = {
+    "en": """
 Goal: collaboratively create a Korean-style vertical-scroll webtoon (doom-scroll friendly)
 about two masc lesbians. Produce a clear storyline with vertically-stacked panels per scene.
 
@@ -28,7 +47,7 @@ Hard requirements:
 - Keep it grounded, emotionally coherent, and scene-to-scene progression makes sense.
 - Ideas can be inspired by the current conversation + any retrieved context (subtitles/frames).
 """,
-        "zh_Hans": """
+    "zh_Hans": """
 目标：协作创作一个韩国风格的垂直滚动网络漫画（适合无限滚动）
 关于两个男性化女同性恋者。为每个场景生成清晰的故事情节，包含垂直堆叠的面板。
 
@@ -43,7 +62,7 @@ Hard requirements:
 - 保持接地气、情感连贯，场景之间的进展合理。
 - 想法可以受到当前对话+任何检索到的上下文（字幕/帧）的启发。
 """,
-        "zh_Hant": """
+    "zh_Hant": """
 目標：協作創作一個韓國風格的垂直滾動網絡漫畫（適合無限滾動）
 關於兩個男性化女同性戀者。為每個場景生成清晰的故事情節，包含垂直堆疊的面板。
 
@@ -58,14 +77,24 @@ Hard requirements:
 - 保持接地氣、情感連貫，場景之間的進展合理。
 - 想法可以受到當前對話+任何檢索到的上下文（字幕/幀）的啟發。
 """
-    }
+}
 
-    return goals.get(lang, goals["en"])
 
+def _current_lang() -> str:
+    """Get the configured language code, normalized (e.g. "zh-Hans" -> "zh_Hans")."""
+    return config.get("language", "en").replace("-", "_")
 
-def create_storyline_planner() -> LlmAgent:
-    """Creates the initial storyline draft (JSON) and stores it via plan_storyline tool."""
-    lang = config.get("language", "en").replace("-", "_")
+
+def get_webtoon_goal(lang: str = None) -> str:
+    """Get webtoon goal text in the specified language."""
+    if lang is None:
+        lang = _current_lang()
+
+    return _WEBTOON_GOALS.get(lang, _WEBTOON_GOALS["en"])
+
+
+def _planner_instruction(lang: str) -> str:
+    """Build the storyline planner instruction for a language."""
     webtoon_goal = get_webtoon_goal(lang)
 
     if lang == "zh_Hans":
@@ -74,10 +103,6 @@ def create_storyline_planner() -> LlmAgent:
 
 {webtoon_goal}
 
-可用输入：
-- 最新用户消息：{{new_message}}
-- 最近对话摘要：{{history_summary}}
-
 工作流程：
 1) 调用 prepare_turn_context(query) 从RAG或节目上下文中提取任何相关灵感。
    使用类似这样的查询："男性化女同性恋网络漫画情节节拍、关系紧张、场景、对话"。
@@ -116,6 +141,10 @@ def create_storyline_planner() -> LlmAgent:
 仅对真正沉默的时刻使用空字符串 ""（每个场景最多1-2个面板）。
 
 调用 plan_storyline 后，不要输出任何其他内容。
+
+可用输入：
+- 最新用户消息：{{new_message}}
+- 最近对话摘要：{{history_summary}}
 """
     elif lang == "zh_Hant":
         instruction = f"""
@@ -123,10 +152,6 @@ def create_storyline_planner() -> LlmAgent:
 
 {webtoon_goal}
 
-可用輸入：
-- 最新用戶消息：{{new_message}}
-- 最近對話摘要：{{history_summary}}
-
 工作流程：
 1) 調用 prepare_turn_context(query) 從RAG或節目上下文中提取任何相關靈感。
    使用類似這樣的查詢："男性化女同性戀網絡漫畫情節節拍、關係緊張、場景、對話"。
@@ -165,6 +190,10 @@ def create_storyline_planner() -> LlmAgent:
 僅對真正沉默的時刻使用空字符串 ""（每個場景最多1-2個面板）。
 
 調用 plan_storyline 後，不要輸出任何其他內容。
+
+可用輸入：
+- 最新用戶消息：{{new_message}}
+- 最近對話摘要：{{history_summary}}
 """
     else:  # English
         instruction = f"""
@@ -172,10 +201,6 @@ You are a story planner for a Korean-style vertical-scroll webtoon.
 
 {webtoon_goal}
 
-Inputs available:
-- Latest user message: {{new_message}}
-- Recent conversation summary: {{history_summary}}
-
 Workflow:
 1) Call prepare_turn_context(query) to pull any relevant inspiration from RAG or show context.
    Use a query like: "masc lesbian webtoon plot beats, relationship tension, scenes, dialogue".
@@ -214,20 +239,17 @@ CRITICAL: Every panel MUST have dialogue. Use formats like:
 Only use empty string "" for truly silent moments (max 1-2 per scene).
 
 After calling plan_storyline, do NOT output anything else.
+
+Inputs available:
+- Latest user message: {{new_message}}
+- Recent conversation summary: {{history_summary}}
 """
 
-    return LlmAgent(
-        name="StorylinePlanner",
-        model=MODEL_NAME,
-        description="Generates an initial webtoon storyline draft as JSON and stores it.",
-        instruction=instruction,
-        tools=[prepare_turn_context, retrieve_scene, plan_storyline],
-    )
+    return instruction
 
 
-def create_storyline_reviewer() -> LlmAgent:
-    """Reviews storyline quality and exits loop when it passes."""
-    lang = config.get("language", "en").replace("-", "_")
+def _reviewer_instruction(lang: str) -> str:
+    """Build the storyline reviewer instruction for a language."""
     webtoon_goal = get_webtoon_goal(lang)
 
     if lang == "zh_Hans":
@@ -237,8 +259,7 @@ def create_storyline_reviewer() -> LlmAgent:
 {webtoon_goal}
 
 你必须：
-1) 调用 review_storyline(storyline_json=...) 使用状态中的当前故事情节JSON：
-   使用 {{current_storyline_json}} 作为参数。
+1) 调用 review_storyline(storyline_json=...)，使用下方的当前故事情节JSON作为参数。
 2) 如果工具结果是通过：调用 exit_loop() 并回复：
    "故事情节满足所有要求。退出细化循环。"
 3) 如果失败：输出简洁的可操作反馈（1-6个要点）关于下一步要修复的内容。
@@ -246,6 +267,9 @@ def create_storyline_reviewer() -> LlmAgent:
 重要：检查大多数面板是否有对话。如果太多面板有空对话，提供反馈以添加对话（口语台词、内心独白或叙述）。
 
 不要添加额外的散文。要么调用 exit_loop 并返回完成消息，要么提供反馈。
+
+当前故事情节JSON：
+{{current_storyline_json}}
 """
     elif lang == "zh_Hant":
         instruction = f"""
@@ -254,8 +278,7 @@ def create_storyline_reviewer() -> LlmAgent:
 {webtoon_goal}
 
 你必須：
-1) 調用 review_storyline(storyline_json=...) 使用狀態中的當前故事情節JSON：
-   使用 {{current_storyline_json}} 作為參數。
+1) 調用 review_storyline(storyline_json=...)，使用下方的當前故事情節JSON作為參數。
 2) 如果工具結果是通過：調用 exit_loop() 並回復：
    "故事情節滿足所有要求。退出細化循環。"
 3) 如果失敗：輸出簡潔的可操作反饋（1-6個要點）關於下一步要修復的內容。
@@ -263,6 +286,9 @@ def create_storyline_reviewer() -> LlmAgent:
 重要：檢查大多數面板是否有對話。如果太多面板有空對話，提供反饋以添加對話（口語台詞、內心獨白或敘述）。
 
 不要添加額外的散文。要麼調用 exit_loop 並返回完成消息，要麼提供反饋。
+
+當前故事情節JSON：
+{{current_storyline_json}}
 """
     else:  # English
         instruction = f"""
@@ -271,8 +297,7 @@ You are a webtoon storyline quality reviewer.
 {webtoon_goal}
 
 You must:
-1) Call review_storyline(storyline_json=...) using the current storyline JSON from state:
-   Use {{current_storyline_json}} as the argument.
+1) Call review_storyline(storyline_json=...) using the current storyline JSON below as the argument.
 2) If the tool result is pass: call exit_loop() and respond with:
    "Storyline meets all requirements. Exiting the refinement loop."
 3) If fail: output concise actionable feedback (1-6 bullet points) about what to fix next.
@@ -280,21 +305,16 @@ You must:
 IMPORTANT: Check that most panels have dialogue. If too many panels have empty dialogue, provide feedback to add dialogue (spoken lines, internal monologue, or narration).
 
 Do not add extra prose. Either call exit_loop and return the completion message OR provide feedback.
+
+Current storyline JSON:
+{{current_storyline_json}}
 """
 
-    return LlmAgent(
-        name="StorylineReviewer",
-        model=MODEL_NAME,
-        description="Reviews the current storyline JSON for structural quality; exits loop when ready.",
-        instruction=instruction,
-        tools=[review_storyline, exit_loop],
-        output_key="review_feedback",
-    )
+    return instruction
 
 
-def create_storyline_refiner() -> LlmAgent:
-    """Refines storyline JSON based on review feedback."""
-    lang = config.get("language", "en").replace("-", "_")
+def _refiner_instruction(lang: str) -> str:
+    """Build the storyline refiner instruction for a language."""
     webtoon_goal = get_webtoon_goal(lang)
 
     if lang == "zh_Hans":
@@ -303,11 +323,6 @@ def create_storyline_refiner() -> LlmAgent:
 
 {webtoon_goal}
 
-输入：
-- 当前故事情节JSON：{{current_storyline_json}}
-- 审查反馈：{{review_feedback}}
-- 剧集进度摘要：{{episode_progress}}
-
 任务：
 - 应用反馈并改进故事情节。
 - 保持严格的JSON匹配模式。
@@ -321,6 +336,11 @@ def create_storyline_refiner() -> LlmAgent:
 1) 仅生成严格的JSON字符串。
 2) 然后恰好调用一次 refine_storyline(storyline_json=...)。
 3) 不要输出任何其他内容。
+
+输入：
+- 当前故事情节JSON：{{current_storyline_json}}
+- 审查反馈：{{review_feedback}}
+- 剧集进度摘要：{{episode_progress}}
 """
     elif lang == "zh_Hant":
         instruction = f"""
@@ -328,11 +348,6 @@ def create_storyline_refiner() -> LlmAgent:
 
 {webtoon_goal}
 
-輸入：
-- 當前故事情節JSON：{{current_storyline_json}}
-- 審查反饋：{{review_feedback}}
-- 劇集進度摘要：{{episode_progress}}
-
 任務：
 - 應用反饋並改進故事情節。
 - 保持嚴格的JSON匹配模式。
@@ -346,6 +361,11 @@ def create_storyline_refiner() -> LlmAgent:
 1) 僅生成嚴格的JSON字符串。
 2) 然後恰好調用一次 refine_storyline(storyline_json=...)。
 3) 不要輸出任何其他內容。
+
+輸入：
+- 當前故事情節JSON：{{current_storyline_json}}
+- 審查反饋：{{review_feedback}}
+- 劇集進度摘要：{{episode_progress}}
 """
     else:  # English
         instruction = f"""
@@ -353,11 +373,6 @@ You refine a webtoon storyline JSON.
 
 {webtoon_goal}
 
-Inputs:
-- Current storyline JSON: {{current_storyline_json}}
-- Review feedback: {{review_feedback}}
-- Episode progress summary: {{episode_progress}}
-
 Task:
 - Apply the feedback and improve the storyline.
 - Keep it STRICT JSON matching the schema.
@@ -371,23 +386,136 @@ Output instructions:
 1) Produce STRICT JSON string only.
 2) Then call refine_storyline(storyline_json=...) exactly once.
 3) Do not output anything else.
+
+Inputs:
+- Current storyline JSON: {{current_storyline_json}}
+- Review feedback: {{review_feedback}}
+- Episode progress summary: {{episode_progress}}
 """
 
+    return instruction
+
+
+# Storyline instructions only vary by role and language, so render them all
+# once at import instead of rebuilding the f-strings in every factory call.
+# Each instruction keeps its static text (role, goal, workflow, schema) first
+# and the per-turn ADK state placeholders at the end, so consecutive calls in
+# the refinement loop share the longest possible prompt prefix.
+_INSTRUCTION_BUILDERS = {
+    "planner": _planner_instruction,
+    "reviewer": _reviewer_instruction,
+    "refiner": _refiner_instruction,
+}
+_INSTRUCTIONS = {
+    (role, lang): build(lang)
+    for role, build in _INSTRUCTION_BUILDERS.items()
+    for lang in ("en", "zh_Hans", "zh_Hant")
+}
+
+
+def _get_instruction(role: str, lang: str) -> str:
+    """Get the precomputed instruction for a role, falling back to English."""
+    return _INSTRUCTIONS.get((role, lang), _INSTRUCTIONS[(role, "en")])
+
+
+# The storyline agents have no per-turn configuration, so each is built once per
+# language and the factories hand out detached copies (ADK agents can only
+# have one parent).
+@functools.lru_cache(maxsize=3)
+def _storyline_planner(lang: str) -> LlmAgent:
+    return LlmAgent(
+        name="StorylinePlanner",
+        model=MODEL_NAME,
+        description="Generates an initial webtoon storyline draft as JSON and stores it.",
+        instruction=_get_instruction("planner", lang),
+        tools=[prepare_turn_context, retrieve_scene, plan_storyline],
+    )
+
+
+@functools.lru_cache(maxsize=3)
+def _storyline_reviewer(lang: str, model: str) -> LlmAgent:
+    return LlmAgent(
+        name="StorylineReviewer",
+        model=model,
+        description="Reviews the current storyline JSON for structural quality; exits loop when ready.",
+        instruction=_get_instruction("reviewer", lang),
+        tools=[review_storyline, exit_loop],
+        output_key="review_feedback",
+    )
+
+
+@functools.lru_cache(maxsize=3)
+def _storyline_refiner(lang: str) -> LlmAgent:
     return LlmAgent(
         name="StorylineRefiner",
         model=MODEL_NAME,
         description="Refines the current storyline JSON based on review feedback.",
-        instruction=instruction,
+        instruction=_get_instruction("refiner", lang),
         tools=[refine_storyline],
     )
 
 
+def create_storyline_planner() -> LlmAgent:
+    """Creates the initial storyline draft (JSON) and stores it via plan_storyline tool."""
+    return detached_copy(_storyline_planner(_current_lang()))
+
+
+def create_storyline_reviewer() -> LlmAgent:
+    """Reviews storyline quality and exits loop when it passes."""
+    model = config.get("storyline_reviewer_model") or os.getenv("STORYLINE_REVIEWER_MODEL") or REVIEWER_MODEL
+    return detached_copy(_storyline_reviewer(_current_lang(), model))
+
+
+def create_storyline_refiner() -> LlmAgent:
+    """Refines storyline JSON based on review feedback."""
+    return detached_copy(_storyline_refiner(_current_lang()))
+
+
+class StructuralReviewGate(BaseAgent):
+    """Ends the refinement loop without an LLM call once the storyline passes review.
+
+    Runs the same deterministic checks as the review_storyline tool on the
+    current storyline. On a pass it records the result and escalates like
+    exit_loop would; otherwise it does nothing and the LLM reviewer runs.
+    """
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        delta: dict = {}
+        state = State(value=ctx.session.state, delta=delta)
+
+        version = current_storyline_version(state)
+        if version <= 0:
+            return
+
+        result = evaluate_storyline(str(state.get("current_storyline_json")))
+        if result["result"] != "pass":
+            return
+
+        print(f"[STORYLINE_GATE] v{version} passes structural review, skipping LLM reviewer")
+        state["review_feedback"] = result["feedback"]
+        state["storyline_review_status"] = "pass"
+        announce_refinement_complete(state, version)
+        yield Event(
+            author=self.name,
+            invocation_id=ctx.invocation_id,
+            branch=ctx.branch,
+            actions=EventActions(escalate=True, state_delta=delta),
+        )
+
+
 def create_storyline_planning_loop() -> LoopAgent:
-    """Loop: reviewer -> refiner until reviewer calls exit_loop."""
+    """Loop: structural gate -> reviewer -> refiner until the storyline passes."""
     return LoopAgent(
         name="StorylinePlanningLoop",
         max_iterations=5,  # Reduced from 10 to speed up execution
-        sub_agents=[create_storyline_reviewer(), create_storyline_refiner()],
+        sub_agents=[
+            StructuralReviewGate(
+                name="StructuralReviewGate",
+                description="Exits the loop without an LLM call when the storyline passes structural review.",
+            ),
+            create_storyline_reviewer(),
+            create_storyline_refiner(),
+        ],
         description="Iteratively reviews and refines the webtoon storyline until quality requirements are met.",
     )
 
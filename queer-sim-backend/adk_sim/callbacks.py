@@ -5,7 +5,7 @@ This module provides callbacks that enhance agent behavior, such as detecting
 timestamps in agent output and automatically retrieving frame images.
 """
 
-import asyncio
+import logging
 import re
 from typing import Optional
 
@@ -16,6 +16,18 @@ from google.adk.models import LlmResponse
 from . import tools as tools_module
 from config import config
 
+logger = logging.getLogger(__name__)
+
+# Timestamp pattern, compiled once at import. Matches a single timestamp
+# ("00:12:34") or a range ("00:12:34–00:12:36"); groups are the start time.
+_TIMESTAMP_RE = re.compile(
+    r'(\d{1,2}):(\d{2}):(\d{2})(?:[,.](\d{1,3}))?'
+    r'(?:[–-]\d{1,2}:\d{2}:\d{2}(?:[,.]\d{1,3})?)?'
+)
+
+# Agents whose output is checked for timestamps
+_PERSONA_IDS = frozenset(tools_module.PERSONA_IDS)
+
 
 def detect_timestamps_in_output(
     callback_context: CallbackContext, llm_response: LlmResponse
@@ -35,115 +47,63 @@ def detect_timestamps_in_output(
     Returns:
         None to keep the original response unchanged, or a modified LlmResponse
     """
-    print(f"[CALLBACK] detect_timestamps_in_output called")
+    logger.debug("[CALLBACK] detect_timestamps_in_output called")
 
     # Get RAG index dynamically (it's set by set_rag_index() in server.py)
     _rag_index = getattr(tools_module, '_rag_index', None)
 
     # Skip if no RAG index available
     if not _rag_index:
-        print(f"[CALLBACK] No RAG index available, skipping")
+        logger.debug("[CALLBACK] No RAG index available, skipping")
         return None
 
+    # Get agent_id from callback context
+    agent_id = callback_context.agent_name  # This should be "a1", "a2", or "a3"
+    logger.debug("[CALLBACK] Agent name from context: %s", agent_id)
+    if not agent_id or agent_id not in _PERSONA_IDS:
+        logger.debug("[CALLBACK] Agent %s not a persona agent, skipping", agent_id)
+        return None  # Only process persona agents
+
     # Skip if response is empty or has no text content
     if not llm_response or not llm_response.content or not llm_response.content.parts:
-        print(f"[CALLBACK] No response content, skipping")
+        logger.debug("[CALLBACK] No response content, skipping")
         return None
 
     # Extract text from the response
-    response_text = ""
-    for part in llm_response.content.parts:
-        if hasattr(part, "text") and part.text:
-            response_text += part.text
+    response_text = "".join(
+        part.text for part in llm_response.content.parts if getattr(part, "text", None)
+    )
 
     if not response_text:
-        print(f"[CALLBACK] No text in response, skipping")
+        logger.debug("[CALLBACK] No text in response, skipping")
         return None
 
-    print(f"[CALLBACK] Response text (first 200 chars): {response_text[:200]}")
+    # Every timestamp pattern contains ":", so most replies can skip the regexes
+    if ":" not in response_text:
+        logger.debug("[CALLBACK] No timestamp in response, skipping")
+        return None
 
-    # Get agent_id from callback context
-    agent_id = callback_context.agent_name  # This should be "a1", "a2", or "a3"
-    print(f"[CALLBACK] Agent name from context: {agent_id}")
-    if not agent_id or agent_id not in ["a1", "a2", "a3"]:
-        print(f"[CALLBACK] Agent {agent_id} not a persona agent, skipping")
-        return None  # Only process persona agents
+    logger.debug("[CALLBACK] Response text (first 200 chars): %.200s", response_text)
 
-    # Search for timestamps in the response text
+    # Search for the first timestamp (or range start) in the response text
     timestamp_str = None
-
-    # Try to match timestamp patterns (same logic as prepare_turn_context)
-    # First try range pattern (e.g., "00:12:34–00:12:36")
-    range_pattern = r'(\d{1,2}):(\d{2}):(\d{2})(?:[,.](\d{1,3}))?[–-](\d{1,2}):(\d{2}):(\d{2})(?:[,.](\d{1,3}))?'
-    range_match = re.search(range_pattern, response_text)
-    if range_match:
-        # Use the start timestamp from the range
-        hh, mm, ss = range_match.groups()[0], range_match.groups()[1], range_match.groups()[2]
-        ms = range_match.groups()[3] if range_match.groups()[3] else "000"
-        ms = ms.ljust(3, '0')[:3]
+    match = _TIMESTAMP_RE.search(response_text)
+    if match:
+        hh, mm, ss, ms = match.groups()
+        ms = (ms or "000").ljust(3, '0')[:3]
         timestamp_str = f"{hh.zfill(2)}:{mm}:{ss},{ms}"
 
-    # If no range match, try single timestamp pattern
-    if not timestamp_str:
-        single_pattern = r'(\d{1,2}):(\d{2}):(\d{2})(?:[,.](\d{1,3}))?'
-        single_match = re.search(single_pattern, response_text)
-        if single_match:
-            groups = single_match.groups()
-            hh, mm, ss = groups[0], groups[1], groups[2]
-            ms = groups[3] if len(groups) > 3 and groups[3] else "000"
-            ms = ms.ljust(3, '0')[:3]
-            timestamp_str = f"{hh.zfill(2)}:{mm}:{ss},{ms}"
-
-    # If we found a timestamp, retrieve the frame
+    # If we found a timestamp, queue it for frame retrieval
     if timestamp_str:
-        print(f"[CALLBACK] Detected timestamp '{timestamp_str}' in agent {agent_id} output")
-        try:
-            # Search for frames by timestamp (run async code synchronously)
-            async def _retrieve_frame():
-                print(f"[CALLBACK] Searching for frames with timestamp: {timestamp_str}")
-                timestamp_hits = await _rag_index.search_frames_by_timestamp(
-                    timestamp_str, tolerance_seconds=10.0
-                )
-                print(f"[CALLBACK] Found {len(timestamp_hits)} frame hits")
-
-                if timestamp_hits:
-                    from rag_index import RAGIndex
-                    frame_info_from_ts = RAGIndex.extract_frame_info(timestamp_hits)
-                    print(f"[CALLBACK] Extracted {len(frame_info_from_ts)} frame info entries")
-
-                    if frame_info_from_ts:
-                        best_frame = frame_info_from_ts[0]
-                        print(f"[CALLBACK] Best frame: {best_frame.get('frame_file')} at {best_frame.get('timestamp')}")
-
-                        # Store frame reference in state for dispatch_persona_replies to use
-                        state = callback_context.state
-                        frame_ref_key = f"{agent_id}_frame_ref"
-                        state[frame_ref_key] = {
-                            "frame_file": best_frame["frame_file"],
-                            "timestamp": best_frame["timestamp"],
-                            "timestamp_seconds": best_frame["timestamp_seconds"],
-                            "caption": best_frame["caption"]
-                        }
-                        print(f"[CALLBACK] Stored frame ref in state[{frame_ref_key}]")
-                    else:
-                        print(f"[CALLBACK] No frame info extracted from hits")
-                else:
-                    print(f"[CALLBACK] No frame hits found for timestamp {timestamp_str}")
-
-            # Since we're in a synchronous callback and can't easily run async code
-            # (nest_asyncio doesn't work with uvloop), we'll store the timestamp
-            # and let dispatch_persona_replies retrieve the frame asynchronously
-            state = callback_context.state
-            state[f"{agent_id}_pending_timestamp"] = timestamp_str
-            print(f"[CALLBACK] Stored pending timestamp {timestamp_str} for agent {agent_id} - will be processed by dispatch_persona_replies")
-        except Exception as e:
-            # Don't fail the callback if frame retrieval fails
-            print(f"[CALLBACK] Error retrieving frame in callback: {e}")
-            import traceback
-            traceback.print_exc()
-            pass
+        logger.debug("[CALLBACK] Detected timestamp '%s' in agent %s output", timestamp_str, agent_id)
+        # The callback is synchronous and can't await the RAG frame search
+        # (nest_asyncio doesn't work with uvloop), so store the timestamp and
+        # let dispatch_persona_replies retrieve the frame asynchronously
+        state = callback_context.state
+        state[f"{agent_id}_pending_timestamp"] = timestamp_str
+        logger.debug("[CALLBACK] Stored pending timestamp %s for agent %s - will be processed by dispatch_persona_replies", timestamp_str, agent_id)
     else:
-        print(f"[CALLBACK] No timestamp found in agent {agent_id} output")
+        logger.debug("[CALLBACK] No timestamp found in agent %s output", agent_id)
 
     # Return None to keep the original response unchanged
     return None
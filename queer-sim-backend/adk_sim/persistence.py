@@ -4,12 +4,50 @@ This module handles saving and loading storyline JSON to/from disk,
 providing durability across server restarts and recovery from failures.
 """
 
-import json
+import logging
+import mmap
+import os
 import time
+from collections import Counter
 from pathlib import Path
 from typing import Dict, Any, Optional, List
 from datetime import datetime
 
+import orjson
+
+logger = logging.getLogger(__name__)
+
+
+def _dumps_pretty(obj: Any) -> bytes:
+    """Serialize to indented UTF-8 JSON (same layout as json.dump(indent=2))."""
+    return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+
+
+def _dumps_line(obj: Any) -> bytes:
+    """Serialize to a single UTF-8 JSON line, including the trailing newline."""
+    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE)
+
+
+def _write_file(path: Path, payload: bytes) -> None:
+    """Write payload to path and flush it to disk before returning."""
+    with open(path, "wb") as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _write_atomic(path: Path, payload: bytes) -> None:
+    """Write payload to a temporary file and rename it over path.
+
+    Readers see either the old file or the complete new one, and a path that
+    is hardlinked elsewhere is replaced rather than truncated in place. The
+    data is fsynced before the rename, so a crash can't leave a renamed but
+    empty file.
+    """
+    tmp = path.with_name(path.name + ".tmp")
+    _write_file(tmp, payload)
+    os.replace(tmp, path)
+
 
 class StorylinePersistence:
     """Manages persistent storage of storyline state to disk."""
@@ -22,6 +60,8 @@ class StorylinePersistence:
         """
         self.base_dir = Path(base_dir)
         self.base_dir.mkdir(parents=True, exist_ok=True)
+        # Storyline directories already created, by name
+        self._dirs: Dict[str, Path] = {}
 
     def get_storyline_dir(self, storyline_dir: str) -> Path:
         """Get the full path for a storyline directory.
@@ -34,8 +74,11 @@ class StorylinePersistence:
         """
         if not storyline_dir or storyline_dir == "default":
             storyline_dir = "default"
-        path = self.base_dir / storyline_dir
-        path.mkdir(parents=True, exist_ok=True)
+        path = self._dirs.get(storyline_dir)
+        if path is None:
+            path = self.base_dir / storyline_dir
+            path.mkdir(parents=True, exist_ok=True)
+            self._dirs[storyline_dir] = path
         return path
 
     def save_storyline(
@@ -68,22 +111,24 @@ class StorylinePersistence:
             if "meta" not in storyline:
                 storyline["meta"] = {}
             storyline["meta"]["version"] = version
-            storyline["meta"]["updated_ts"] = time.time()
+            now = time.time()
+            storyline["meta"]["updated_ts"] = now
 
-            # Save current.json (latest version)
-            current_file = story_path / "current.json"
-            with open(current_file, "w", encoding="utf-8") as f:
-                json.dump(storyline, f, indent=2, ensure_ascii=False)
+            # Serialize once; current.json and the versioned backup are identical
+            payload = _dumps_pretty(storyline)
 
             # Save versioned backup
             versioned_file = story_path / f"v{version}.json"
-            with open(versioned_file, "w", encoding="utf-8") as f:
-                json.dump(storyline, f, indent=2, ensure_ascii=False)
+            _write_atomic(versioned_file, payload)
+
+            # Save current.json (latest version) as a hardlink to the backup
+            current_file = story_path / "current.json"
+            self._replace_with_link(versioned_file, current_file, payload)
 
             # Append to update log
             log_entry = {
-                "timestamp": time.time(),
-                "datetime": datetime.now().isoformat(),
+                "timestamp": now,
+                "datetime": datetime.fromtimestamp(now).isoformat(),
                 "version": version,
                 "update_type": update_type,
                 "scene_count": len(storyline.get("scenes", [])),
@@ -91,7 +136,9 @@ class StorylinePersistence:
             }
             self.append_update_log(storyline_dir, log_entry)
 
-            print(f"[PERSISTENCE] Saved storyline v{version} to {current_file} and {versioned_file}")
+            logger.info(
+                "[PERSISTENCE] Saved storyline v%d to %s and %s", version, current_file, versioned_file
+            )
 
             return {
                 "status": "ok",
@@ -100,14 +147,32 @@ class StorylinePersistence:
                 "version": version
             }
         except Exception as e:
-            print(f"[PERSISTENCE] Error saving storyline: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("[PERSISTENCE] Error saving storyline: %s", e)
             return {
                 "status": "error",
                 "error": str(e)
             }
 
+    @staticmethod
+    def _replace_with_link(source: Path, target: Path, payload: bytes) -> None:
+        """Atomically replace target with a hardlink to source.
+
+        The link is made under a temporary name and renamed over target, so
+        target gets a new inode and the file it used to point to (the previous
+        version's backup) is never modified. Where hardlinks aren't supported,
+        payload is written to the temporary file instead.
+        """
+        tmp = target.with_name(target.name + ".tmp")
+        try:
+            tmp.unlink()  # Leftover from an interrupted save
+        except FileNotFoundError:
+            pass
+        try:
+            os.link(source, tmp)
+        except OSError:
+            _write_file(tmp, payload)
+        os.replace(tmp, target)
+
     def load_latest_storyline(self, storyline_dir: str) -> Optional[Dict[str, Any]]:
         """Load most recent storyline from disk.
 
@@ -125,8 +190,7 @@ class StorylinePersistence:
             # Try current.json first
             current_file = story_path / "current.json"
             if current_file.exists():
-                with open(current_file, "r", encoding="utf-8") as f:
-                    return json.load(f)
+                return orjson.loads(current_file.read_bytes())
 
             # Fallback: find highest version number
             version_files = list(story_path.glob("v*.json"))
@@ -139,12 +203,11 @@ class StorylinePersistence:
                         return 0
 
                 latest_file = max(version_files, key=get_version)
-                with open(latest_file, "r", encoding="utf-8") as f:
-                    return json.load(f)
+                return orjson.loads(latest_file.read_bytes())
 
             return None
         except Exception as e:
-            print(f"[PERSISTENCE] Error loading storyline: {e}")
+            logger.error("[PERSISTENCE] Error loading storyline: %s", e)
             return None
 
     def append_update_log(self, storyline_dir: str, log_entry: Dict[str, Any]) -> None:
@@ -158,10 +221,10 @@ class StorylinePersistence:
             story_path = self.get_storyline_dir(storyline_dir)
             log_file = story_path / "updates.jsonl"
 
-            with open(log_file, "a", encoding="utf-8") as f:
-                f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
+            with open(log_file, "ab") as f:
+                f.write(_dumps_line(log_entry))
         except Exception as e:
-            print(f"[PERSISTENCE] Error appending to update log: {e}")
+            logger.error("[PERSISTENCE] Error appending to update log: %s", e)
 
     def _extract_episode_info(self, storyline: Dict[str, Any]) -> Dict[str, Any]:
         """Extract episode information from storyline.
@@ -172,18 +235,14 @@ class StorylinePersistence:
         Returns:
             Dict with episode counts and completion status
         """
-        scenes = storyline.get("scenes", [])
-        episodes = {}
-
-        for scene in scenes:
-            if not isinstance(scene, dict):
-                continue
-            ep_num = scene.get("episode", 0)
-            if ep_num > 0:
-                ep_key = str(ep_num)
-                if ep_key not in episodes:
-                    episodes[ep_key] = {"scene_count": 0, "complete": False}
-                episodes[ep_key]["scene_count"] += 1
+        counts = Counter()
+        for scene in storyline.get("scenes", []):
+            if isinstance(scene, dict) and (ep_num := scene.get("episode", 0)) > 0:
+                counts[str(ep_num)] += 1
+        episodes = {
+            ep_key: {"scene_count": count, "complete": False}
+            for ep_key, count in counts.items()
+        }
 
         # Check completion status from meta
         meta = storyline.get("meta", {})
@@ -212,21 +271,28 @@ class StorylinePersistence:
             if not log_file.exists():
                 return []
 
+            # Scan backwards from the end of the file so only the last `limit`
+            # lines are parsed, however long the log has grown
             entries = []
-            with open(log_file, "r", encoding="utf-8") as f:
-                for line in f:
-                    line = line.strip()
-                    if line:
-                        try:
-                            entries.append(json.loads(line))
-                        except json.JSONDecodeError:
-                            continue
-
-            # Return most recent first
-            entries.reverse()
-            return entries[:limit]
+            with open(log_file, "rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return []
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    end = len(mm)
+                    while end > 0 and len(entries) < limit:
+                        start = mm.rfind(b"\n", 0, end) + 1
+                        line = mm[start:end].strip()
+                        if line:
+                            try:
+                                entries.append(orjson.loads(line))
+                            except orjson.JSONDecodeError:
+                                pass
+                        end = start - 1
+
+            # Most recent first
+            return entries
         except Exception as e:
-            print(f"[PERSISTENCE] Error reading update history: {e}")
+            logger.error("[PERSISTENCE] Error reading update history: %s", e)
             return []
 
 
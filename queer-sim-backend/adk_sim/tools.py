@@ -3,11 +3,17 @@ import random
 import json
 from typing import Any, Dict, List, Optional
 import re
+import traceback
 from google.adk.tools.tool_context import ToolContext
 from .state import add_message, add_dm, update_agent_pos, add_to_outbox
 from .persistence import get_storyline_persistence
 from .validation import validate_storyline_state
+import orjson
 from config import config
+from rag_index import RAGIndex
+
+# Persona agent ids, in their default order
+PERSONA_IDS = ("a1", "a2", "a3")
 
 
 def _has_cjk(text: str) -> bool:
@@ -150,7 +156,10 @@ def send_message(
     *,
     tool_context: ToolContext,
 ):
-    """Send a message to a specific room. If sender is not provided, it will be inferred from the calling agent."""
+    """Send a message to a specific room (default "group_chat").
+
+    If sender is not provided, it is inferred from the calling agent's id.
+    """
     state = tool_context.state
 
     # If sender not provided, try to infer from agent_id in tool_context
@@ -184,7 +193,10 @@ def send_dm(
     return {"status": "sent", "text": text}
 
 def move_room(agent_id: str, agent_name: str, room: str, tool_context: ToolContext):
-    """Move an agent to another room."""
+    """Move an agent to another room.
+
+    Pass your own agent_id and your display name as agent_name.
+    """
     state = tool_context.state
     if room in state["rooms"]:
         new_pos = {"x": random.uniform(0.1, 0.9), "y": random.uniform(0.1, 0.9)}
@@ -203,7 +215,7 @@ def move_room(agent_id: str, agent_name: str, room: str, tool_context: ToolConte
     return {"status": "error", "message": f"Room {room} not found"}
 
 def wait(minutes: int, tool_context: ToolContext):
-    """Do nothing for a while. Use this when you want to observe or wait before taking action."""
+    """Do nothing for a while. Use this when you want to observe or wait before taking action (use sparingly)."""
     # In a real-time simulation, we don't actually wait, but we can log this action
     return {"status": "waited", "minutes": minutes, "message": f"Waited {minutes} minutes"}
 
@@ -221,7 +233,7 @@ def plan_storyline(
     print(f"[PLAN_STORYLINE] Called with JSON length: {len(storyline_json)}")
     state = tool_context.state
     try:
-        parsed = json.loads(storyline_json)
+        parsed = orjson.loads(storyline_json)
     except Exception as e:
         state["review_feedback"] = f"Invalid JSON: {e}"
         state["storyline_review_status"] = "fail"
@@ -281,25 +293,15 @@ def plan_storyline(
     return {"result": "ok", "version": version}
 
 
-def review_storyline(
-    storyline_json: str,
-    *,
-    tool_context: ToolContext,
-) -> Dict[str, Any]:
-    """Deterministically review a storyline JSON draft for basic quality gates.
+def evaluate_storyline(storyline_json: str) -> Dict[str, Any]:
+    """Run the deterministic storyline quality gates without touching state.
 
-    This tool is intended to be called by a reviewer agent which decides whether to
-    call exit_loop after reading the tool result.
+    Returns the same result dict as review_storyline ("result" is "pass" or "fail").
     """
-    print(f"[REVIEW_STORYLINE] Called with JSON length: {len(storyline_json)}")
-    state = tool_context.state
     try:
-        parsed = json.loads(storyline_json)
+        parsed = orjson.loads(storyline_json)
     except Exception as e:
-        feedback = f"Invalid JSON: {e}"
-        state["review_feedback"] = feedback
-        state["storyline_review_status"] = "fail"
-        return {"result": "fail", "feedback": feedback}
+        return {"result": "fail", "feedback": f"Invalid JSON: {e}"}
 
     issues: list[str] = []
     if not isinstance(parsed, dict):
@@ -351,14 +353,54 @@ def review_storyline(
 
     if issues:
         feedback = "Needs work:\n- " + "\n- ".join(issues)
-        state["review_feedback"] = feedback
-        state["storyline_review_status"] = "fail"
         return {"result": "fail", "feedback": feedback, "issues": issues}
 
-    feedback = "Passes basic structural quality checks."
-    state["review_feedback"] = feedback
-    state["storyline_review_status"] = "pass"
-    return {"result": "pass", "feedback": feedback}
+    return {"result": "pass", "feedback": "Passes basic structural quality checks."}
+
+
+def current_storyline_version(state: Any) -> int:
+    """Return the current storyline version, or 0 if no storyline exists yet.
+
+    The refinement loop must never finish at v0: exit_loop and the structural
+    review gate both check this before ending it.
+    """
+    try:
+        version = int(state.get("storyline_version") or 0)
+    except Exception:
+        version = 0
+    cur = state.get("current_storyline")
+    cur_json = state.get("current_storyline_json") or ""
+    if version <= 0 or not isinstance(cur, dict) or not cur or not str(cur_json).strip():
+        return 0
+    return version
+
+
+def announce_refinement_complete(state: Any, version: int) -> None:
+    """Post the visible "refinement complete" message for a finished storyline."""
+    add_message(state, "group_chat", "System", f"Storyline refinement complete (v{version}).")
+
+
+def review_storyline(
+    storyline_json: str,
+    *,
+    tool_context: ToolContext,
+) -> Dict[str, Any]:
+    """Deterministically review a storyline JSON draft for basic quality gates.
+
+    This tool is intended to be called by a reviewer agent which decides whether to
+    call exit_loop after reading the tool result.
+    """
+    print(f"[REVIEW_STORYLINE] Called with JSON length: {len(storyline_json)}")
+    state = tool_context.state
+    result = evaluate_storyline(storyline_json)
+    state["review_feedback"] = result["feedback"]
+    state["storyline_review_status"] = result["result"]
+    return result
+
+
+def _storyline_content(storyline: Dict[str, Any]) -> Dict[str, Any]:
+    """Get a storyline without its bookkeeping meta (version, timestamps)."""
+    return {k: v for k, v in storyline.items() if k != "meta"}
 
 
 def refine_storyline(
@@ -374,7 +416,7 @@ def refine_storyline(
     print(f"[REFINE_STORYLINE] Called with JSON length: {len(storyline_json)}")
     state = tool_context.state
     try:
-        parsed = json.loads(storyline_json)
+        parsed = orjson.loads(storyline_json)
     except Exception as e:
         state["review_feedback"] = f"Invalid JSON: {e}"
         state["storyline_review_status"] = "fail"
@@ -465,6 +507,29 @@ def refine_storyline(
                 parsed["scenes"] = final_scenes
                 print(f"[REFINE_STORYLINE] Preserved {len(existing_scene_map)} existing scenes (including {len(completed_episodes)} completed episodes), merged with {len(new_scenes)} new/refined scenes")
 
+    # Converged: the refiner returned the same storyline as the current one, so
+    # further review/refine iterations can't improve it. Keep the current
+    # version and end the refinement loop instead of bumping the version.
+    version = current_storyline_version(state)
+    if version > 0 and isinstance(existing, dict):
+        if _storyline_content(parsed) == _storyline_content(existing):
+            print(f"[REFINE_STORYLINE] Storyline unchanged from v{version}, ending refinement loop")
+            review = evaluate_storyline(state.get("current_storyline_json"))
+            state["review_feedback"] = review["feedback"]
+            state["storyline_review_status"] = review["result"]
+            tool_context.actions.escalate = True
+            if review["result"] == "pass":
+                announce_refinement_complete(state, version)
+            else:
+                # Only the completion announcement means the storyline passed review
+                add_message(
+                    state,
+                    "group_chat",
+                    "System",
+                    f"Storyline refinement stalled at v{version} (review failed).",
+                )
+            return {"result": "ok", "version": version, "unchanged": True, "review": review["result"]}
+
     version = int(state.get("storyline_version") or 0) + 1
     parsed.setdefault("meta", {})
     if isinstance(parsed.get("meta"), dict):
@@ -511,14 +576,8 @@ def exit_loop(*, tool_context: ToolContext) -> Dict[str, Any]:
     # Guardrail: do NOT allow "complete" when no storyline exists yet.
     # We saw repeated "Storyline refinement complete (v0)" messages when the reviewer
     # incorrectly called exit_loop before plan_storyline/refine_storyline ever ran.
-    try:
-        version = int(state.get("storyline_version") or 0)
-    except Exception:
-        version = 0
-    cur = state.get("current_storyline")
-    cur_json = state.get("current_storyline_json") or ""
-
-    if version <= 0 or not isinstance(cur, dict) or not cur or not str(cur_json).strip():
+    version = current_storyline_version(state)
+    if version <= 0:
         state["storyline_review_status"] = "fail"
         state["review_feedback"] = "No storyline exists yet. Create one first (plan_storyline) before exiting the loop."
         add_message(
@@ -532,7 +591,7 @@ def exit_loop(*, tool_context: ToolContext) -> Dict[str, Any]:
     tool_context.actions.escalate = True
 
     # Emit a visible event that the storyline has reached a stopping point.
-    add_message(state, "group_chat", "System", f"Storyline refinement complete (v{version}).")
+    announce_refinement_complete(state, version)
     return {"result": "ok", "version": version}
 
 def _get_agent_id_from_tool_context(tool_context: ToolContext) -> str:
@@ -909,7 +968,7 @@ def check_episode_completion_votes(state: Dict[str, Any], *, episode_number: int
     if not isinstance(votes, dict):
         return False
     yes = 0
-    for aid in ["a1", "a2", "a3"]:
+    for aid in PERSONA_IDS:
         v = votes.get(aid)
         if not isinstance(v, dict):
             continue
@@ -931,8 +990,6 @@ def detect_votes_in_text(text: str, lang: str = "en") -> tuple[bool, int | None]
 
     # NOTE: Keep detection reasonably strict to avoid false positives.
     # We require an explicit "vote"/"投票"/"贊成票"/"完成第X集" intent, not just generic "yes"/"agree"/"好".
-    import re
-
     vote_intent_patterns = {
         "en": [
             r"\b(i\s+)?vote\s+yes\b",
@@ -1094,7 +1151,7 @@ def _check_story_completion_votes(state: Dict[str, Any]) -> bool:
     if not isinstance(votes, dict):
         return False
     yes = 0
-    for aid in ["a1", "a2", "a3"]:
+    for aid in PERSONA_IDS:
         v = votes.get(aid)
         if not isinstance(v, dict):
             continue
@@ -1267,7 +1324,6 @@ async def rag_search(query: str, k: int = 6):
         return {"error": "RAG index not initialized"}
 
     hits = await _rag_index.search(query, k=k)
-    from rag_index import RAGIndex
     show_snips = RAGIndex.render_for_prompt(hits)
 
     # Extract frame info for context
@@ -1285,14 +1341,15 @@ async def rag_search(query: str, k: int = 6):
     }
 
 async def retrieve_scene(query: str, agent_name: str, room: str, tool_context: ToolContext):
-    """Retrieve and discuss a specific scene from the video. Returns both frame image and transcript context."""
+    """Retrieve and discuss a specific scene from the video. Returns both frame image and transcript context.
+
+    Use when discussing a specific moment or timestamp. Pass your display name
+    as agent_name and "group_chat" as the room.
+    """
     state = tool_context.state
     if not _rag_index:
         return {"error": "RAG index not initialized"}
 
-    import re
-    from rag_index import RAGIndex
-
     # Parse timestamp from query if present
     timestamp_match = re.search(r'(\d{1,2}):(\d{2}):(\d{2})(?:[,.](\d{1,3}))?', query)
     timestamp_str = None
@@ -1390,8 +1447,9 @@ def emit_event(event_type: str, payload: Dict[str, Any], tool_context: ToolConte
 async def prepare_turn_context(query: str, tool_context: ToolContext):
     """Search the show subtitles and frames for relevant content based on a query.
 
-    Use this tool when the conversation mentions the show, characters, scenes, or episodes.
-    The tool will search the knowledge base and return relevant subtitle snippets and frame information.
+    USE THIS FIRST when the conversation mentions the show, characters, scenes, episodes,
+    or specific moments. The tool will search the knowledge base and return relevant
+    subtitle snippets and frame information, which helps you find accurate quotes and context.
 
     Args:
         query: A search query describing what you're looking for (e.g., "emotional moment between characters", "kiss scene", "character name", "episode 2 ending")
@@ -1431,11 +1489,9 @@ async def prepare_turn_context(query: str, tool_context: ToolContext):
         return results
 
     # Extract frame info from the hits
-    from rag_index import RAGIndex
     frame_info = RAGIndex.extract_frame_info(results.get("hits", []))
 
     # Check if query contains a timestamp (e.g., "00:12:34" or "E1P2 00:12:34–00:12:36")
-    import re
     timestamp_match = None
     timestamp_str = None
 
@@ -1534,12 +1590,11 @@ async def dispatch_persona_replies(tool_context: ToolContext, room: str = "group
 
     Filters out tool call patterns (e.g., "prepare_turn_context(...)") that shouldn't be displayed as messages.
     """
-    import re
     state = tool_context.state
     profiles = config.get("agent_profiles", {})
 
     published: list[str] = []
-    for aid in ["a1", "a2", "a3"]:
+    for aid in PERSONA_IDS:
         key = f"{aid}_reply"
         text = state.get(key)
         if not isinstance(text, str) or not text.strip():
@@ -1584,7 +1639,6 @@ async def dispatch_persona_replies(tool_context: ToolContext, room: str = "group
                         pending_timestamp, tolerance_seconds=10.0
                     )
                     if timestamp_hits:
-                        from rag_index import RAGIndex
                         frame_info_from_ts = RAGIndex.extract_frame_info(timestamp_hits)
                         if frame_info_from_ts:
                             best_frame = frame_info_from_ts[0]
@@ -1600,7 +1654,6 @@ async def dispatch_persona_replies(tool_context: ToolContext, room: str = "group
                     state[pending_timestamp_key] = None
                 except Exception as e:
                     print(f"[DISPATCH] Error processing pending timestamp: {e}")
-                    import traceback
                     traceback.print_exc()
 
         print(f"[DISPATCH] Agent {aid} ({sender}): frame_ref = {frame_ref}")
@@ -331,7 +331,14 @@ Mika是一名研究生，將粉絲圈作為壓力釋放。她喜歡化學反應
             "google_api_key": os.getenv("GOOGLE_API_KEY", ""),
             "youtube_frame_scene_threshold": 0.3,
             "storyline_context_dir": "",
-            "storyline_context_content": ""
+            "storyline_context_content": "",
+            # Run persona agents concurrently instead of in shuffled sequence.
+            # Faster turns, but personas no longer see each other's tool-driven
+            # storyline edits within the same turn.
+            "parallel_personas": False,
+            # Model for the storyline reviewer. Empty means STORYLINE_REVIEWER_MODEL
+            # or the lighter default in adk_sim/agents/storyline.py, resolved at use.
+            "storyline_reviewer_model": ""
         }
         self.data = self.load()
 
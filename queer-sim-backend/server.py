@@ -2,7 +2,7 @@
 Run `uvicorn server:app --reload --port 8000` to start the server.
 """
 
-import asyncio, json, time, random, os, logging, re
+import asyncio, json, time, random, os, logging, re, traceback
 from typing import List, Dict, Any
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Query
 from fastapi.middleware.cors import CORSMiddleware
@@ -13,9 +13,18 @@ from config import config
 from youtube_ingest import YouTubeIngestManager
 
 # ADK Imports
-from adk_sim.state import get_initial_state
-from adk_sim.tools import set_rag_index, compute_storyline_milestone, compute_storyline_expansion_milestone
+from adk_sim.state import get_initial_state, add_message, add_dm, add_to_outbox, update_agent_pos
+from adk_sim.tools import (
+    set_rag_index,
+    compute_storyline_milestone,
+    compute_storyline_expansion_milestone,
+    get_episode_progress_summary,
+    process_episode_completion,
+)
+from adk_sim.persistence import get_storyline_persistence
+from adk_sim.validation import validate_storyline_state
 from adk_sim.agents.root import root_agent, create_root_agent_with_shuffled_order
+from adk_sim.agents.personas import invalidate_persona_cache
 from google.adk.runners import Runner
 from google.adk.sessions import InMemorySessionService
 from google.adk.events.event import Event
@@ -26,6 +35,11 @@ from google.genai import types
 # (ADK responses commonly include tool/function_call parts.)
 logging.getLogger("google_genai.types").setLevel(logging.ERROR)
 
+# Show the backend's own info logs (e.g. storyline save confirmations) like the
+# rest of its print output; third-party loggers stay at the WARNING default.
+logging.basicConfig(format="%(message)s")
+logging.getLogger("adk_sim").setLevel(logging.INFO)
+
 app = FastAPI()
 app.add_middleware(
     CORSMiddleware,
@@ -102,7 +116,6 @@ async def seed_initial_chat():
     This ensures that config changes are reflected when the server restarts or when
     the RAG directory is changed.
     """
-    from adk_sim.state import add_message
 
     storyline_context = config.get("storyline_context_content", "")
     storyline_dir = config.get("storyline_context_dir", "")
@@ -250,7 +263,6 @@ Requirements:
             raise ValueError("Empty response from LLM")
 
         # Try to parse JSON from response
-        import json
         # Extract JSON from markdown code blocks if present
         if "```" in content:
             json_start = content.find("```")
@@ -341,7 +353,6 @@ async def flush_adk_outbox():
             else:
                 print(f"[FLUSH] Event {i}: message without frameReference: {event.get('from')} - keys: {list(event.keys())}")
                 # Debug: print full event to see what's there
-                import json
                 print(f"[FLUSH] Full event {i}: {json.dumps(event, default=str)[:200]}")
         elif event.get("type") == "frame_reference":
             print(f"[FLUSH] Event {i}: frame_reference event: {event.get('frame_file')} for agent {event.get('agent')}")
@@ -370,7 +381,6 @@ async def run_adk_turn(new_message_text: str):
             session_id=GLOBAL_SESSION_ID,
         )
         if session_gate and isinstance(session_gate.state, dict) and session_gate.state.get("storyline_done") is True:
-            from adk_sim.state import add_message
             state_gate = session_gate.state
             if not state_gate.get("storyline_done_announced"):
                 add_message(
@@ -402,7 +412,6 @@ async def run_adk_turn(new_message_text: str):
         agents = state.get("agents", [])
         profiles = config.get("agent_profiles", {})
 
-        from adk_sim.state import add_message
         if note:
             add_message(state, room, "System", note)
 
@@ -498,7 +507,6 @@ async def run_adk_turn(new_message_text: str):
         # CRITICAL: Reload storyline from disk to ensure session state is fresh
         # This prevents stale scene counts from causing incorrect agent behavior
         if session_for_summary and session_for_summary.state:
-            from adk_sim.persistence import get_storyline_persistence
             storyline_dir = session_for_summary.state.get("storyline_context_dir") or config.get("storyline_context_dir", "default")
             persistence = get_storyline_persistence()
             disk_storyline = persistence.load_latest_storyline(storyline_dir)
@@ -601,7 +609,6 @@ async def run_adk_turn(new_message_text: str):
         captured_by_author: dict[str, str] = {}
 
         # Recalculate episode progress for state_delta (must be fresh each turn)
-        from adk_sim.tools import get_episode_progress_summary
         # Get fresh state to ensure we have latest episode info
         fresh_session = await session_service.get_session(
             app_name="QueerSim",
@@ -650,7 +657,6 @@ async def run_adk_turn(new_message_text: str):
 
                         # Filter out tool call patterns before capturing
                         if text:
-                            import re
                             tool_call_pattern = r'^\s*(prepare_turn_context|retrieve_scene|send_message|send_dm|move_room|wait)\s*\([^)]*\)\s*$'
                             if not re.match(tool_call_pattern, text.strip(), re.IGNORECASE):
                                 # Also check for JSON tool call structures
@@ -679,9 +685,6 @@ async def run_adk_turn(new_message_text: str):
                     state = session_after_timeout.state
 
                     # Check if episode completion should trigger completion (e.g. 12 scenes reached)
-                    from adk_sim.tools import check_episode_completion_votes, process_episode_completion
-                    from adk_sim.state import add_message, add_to_outbox
-
                     storyline = state.get("current_storyline")
                     if isinstance(storyline, dict):
                         scenes = storyline.get("scenes", [])
@@ -707,7 +710,6 @@ async def run_adk_turn(new_message_text: str):
                     if isinstance(storyline, dict) and storyline:
                         version = state.get("storyline_version", 0)
                         storyline_dir = state.get("storyline_context_dir") or config.get("storyline_context_dir", "default")
-                        from adk_sim.persistence import get_storyline_persistence
                         persistence = get_storyline_persistence()
 
                         # CRITICAL: Check if a newer version already exists on disk
@@ -732,7 +734,6 @@ async def run_adk_turn(new_message_text: str):
                                 }, author="system")
             except Exception as e:
                 print(f"[RUN_ADK] Error processing timeout recovery: {e}")
-                import traceback
                 traceback.print_exc()
             raise
 
@@ -777,7 +778,6 @@ async def run_adk_turn(new_message_text: str):
                 session_id=GLOBAL_SESSION_ID,
             )
             state = session_bridge.state
-            from adk_sim.state import add_message
 
             for author in sorted(captured_by_author.keys()):
                 display = profiles.get(author, {}).get("name") or author
@@ -795,7 +795,6 @@ async def run_adk_turn(new_message_text: str):
         return
     except Exception as e:
         print(f"ADK Turn error: {e}")
-        import traceback
         traceback.print_exc()
         # If any tool output already landed in outbox, flush it instead of spamming fallback.
         try:
@@ -840,7 +839,6 @@ async def proactive_loop():
             agents = state.get("agents", [])
             if agents:
                 agent = random.choice(agents)
-                from adk_sim.state import update_agent_pos, add_to_outbox
 
                 new_pos = {"x": random.uniform(0.1, 0.9), "y": random.uniform(0.1, 0.9)}
                 update_agent_pos(state, agent["name"], agent["room"], new_pos)
@@ -873,8 +871,6 @@ async def get_storyline_debug_state():
         user_id=GLOBAL_USER_ID,
         session_id=GLOBAL_SESSION_ID,
     )
-    from adk_sim.tools import get_episode_progress_summary
-    from adk_sim.validation import validate_storyline_state
 
     state = session.state if session else {}
     storyline = state.get("current_storyline", {})
@@ -909,7 +905,6 @@ async def force_save_storyline():
     version = state.get("storyline_version", 0)
     storyline_dir = state.get("storyline_context_dir") or config.get("storyline_context_dir", "default")
 
-    from adk_sim.persistence import get_storyline_persistence
     persistence = get_storyline_persistence()
     result = persistence.save_storyline(storyline_dir, storyline, version, update_type="manual_save")
 
@@ -929,7 +924,6 @@ async def recover_from_checkpoint():
     state = session.state
     storyline_dir = state.get("storyline_context_dir") or config.get("storyline_context_dir", "default")
 
-    from adk_sim.persistence import get_storyline_persistence
     persistence = get_storyline_persistence()
     loaded = persistence.load_latest_storyline(storyline_dir)
 
@@ -982,7 +976,6 @@ async def ws_endpoint(ws: WebSocket):
                     user_id=GLOBAL_USER_ID,
                     session_id=GLOBAL_SESSION_ID
                 )
-                from adk_sim.state import add_message
                 state = session.state
                 add_message(state, room, "You", text)
                 await apply_state_delta(
@@ -1013,7 +1006,6 @@ async def ws_endpoint(ws: WebSocket):
                     user_id=GLOBAL_USER_ID,
                     session_id=GLOBAL_SESSION_ID
                 )
-                from adk_sim.state import add_dm
                 state = session.state
                 add_dm(state, "You", agent_name, text)
                 await apply_state_delta(
@@ -1052,6 +1044,8 @@ async def get_settings():
 async def update_settings(new_settings: dict):
     for k, v in new_settings.items():
         config.set(k, v)
+    if "agent_profiles" in new_settings:
+        invalidate_persona_cache()
     return {"status": "ok"}
 
 @app.get("/api/rag/directories")